@@ -1,8 +1,11 @@
 """
-Audio analysis module using Parselmouth (Praat) for accurate formant tracking.
+Audio analysis module using LPC formant tracking and Parselmouth (Praat)
+for pitch and intensity.
 Optimized for real-time streaming with small audio chunks.
 """
+import math
 import numpy as np
+from numba import njit
 import parselmouth
 from parselmouth.praat import call
 from dataclasses import dataclass
@@ -44,6 +47,88 @@ IPA_VOWELS = {
     'ɑ': {'f1': 750, 'f2': 1100, 'name': 'open back'},
 }
 
+# Struct-of-arrays view of IPA_VOWELS for nearest-vowel lookup. F1 differences
+# weigh more than F2 ones; the weights are baked into the prototypes.
+_F1_WEIGHT = 1.2
+_F2_WEIGHT = 0.8
+_IPA_KEYS = list(IPA_VOWELS.keys())
+_IPA_F1_SCALED = np.array([v['f1'] * _F1_WEIGHT for v in IPA_VOWELS.values()])
+_IPA_F2_SCALED = np.array([v['f2'] * _F2_WEIGHT for v in IPA_VOWELS.values()])
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _hpf_rms_kernel(x, scale, alpha, prev_x, prev_y, out):
+    """
+    Scale, one-pole high-pass filter and measure RMS in a single pass.
+    Continues from the previous (scaled) input/output sample and writes the
+    filtered block into out (float32, at least as long as x); returns its RMS
+    and the new filter state. The running state and sum of squares stay in
+    double precision.
+    """
+    n = x.shape[0]
+    acc = 0.0
+    px = prev_x
+    py = prev_y
+    for i in range(n):
+        xi = x[i] * scale
+        yi = alpha * (py + xi - px)
+        out[i] = yi
+        acc += yi * yi
+        px = xi
+        py = yi
+    rms = math.sqrt(acc / n) if n > 0 else 0.0
+    return rms, px, py
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _rms(x):
+    """Single-pass RMS without a temporary array of squares."""
+    n = x.shape[0]
+    acc = 0.0
+    for i in range(n):
+        acc += x[i] * x[i]
+    return math.sqrt(acc / n) if n > 0 else 0.0
+
+
+@njit(cache=True, nogil=True)
+def _burg_lpc(x, order):
+    """LPC coefficients [1, a1, ..., a_order] of a frame via Burg's method."""
+    a = np.zeros(order + 1)
+    a[0] = 1.0
+    a_prev = a.copy()
+    fwd = x[1:].astype(np.float64)
+    bwd = x[:-1].astype(np.float64)
+    den = np.dot(fwd, fwd) + np.dot(bwd, bwd)
+    for i in range(order):
+        if den <= 0.0:
+            break
+        k = -2.0 * np.dot(bwd, fwd) / den
+        a_prev[:] = a
+        for j in range(1, i + 2):
+            a[j] = a_prev[j] + k * a_prev[i - j + 1]
+        fwd_next = fwd + k * bwd
+        bwd = bwd + k * fwd
+        fwd = fwd_next
+        den = (1.0 - k * k) * den - bwd[-1] ** 2 - fwd[0] ** 2
+        fwd = fwd[1:]
+        bwd = bwd[:-1]
+    return a
+
+
+@njit(cache=True, nogil=True)
+def _nearest_vowel(f1, f2, proto_f1, proto_f2):
+    """Index of the nearest prototype and its squared distance (pre-weighted inputs)."""
+    best = 0
+    best_d2 = np.inf
+    for i in range(proto_f1.shape[0]):
+        df1 = f1 - proto_f1[i]
+        df2 = f2 - proto_f2[i]
+        d2 = df1 * df1 + df2 * df2
+        if d2 < best_d2:
+            best_d2 = d2
+            best = i
+    return best, best_d2
+
 
 class AudioAnalyzer:
     """
@@ -59,17 +144,40 @@ class AudioAnalyzer:
         self.max_formant_freq = 5500
         self.window_length = 0.015  # 15ms window for faster response
         self.pre_emphasis = 50
+        # As in Praat, the LPC fit runs on audio resampled to twice the
+        # formant ceiling, with one pole pair per formant
+        self._formant_rate = 2 * self.max_formant_freq
+        self.lpc_order = 2 * self.max_formants
+        # Like Praat's Burg, the analysis frame spans twice window_length
+        self._formant_window = np.hamming(int(2 * self.window_length * self._formant_rate))
+        self._pre_emphasis_coef = math.exp(-2.0 * math.pi * self.pre_emphasis / self._formant_rate)
+        # Windows overlap 50%, so run formant analysis on every Nth voiced
+        # window and reuse the previous formants of the same stream in between
+        self.formant_interval = 2
+        self._raw_formants: Optional[tuple[float, float, float]] = None
+        self._formant_tick = 0
         
         self.pitch_floor = 75
         self.pitch_ceiling = 500
         
+        # First-order high-pass (RC approximation) against rumble/HVAC noise.
+        # Setting the cutoff recomputes the filter coefficient.
+        self.hpf_cutoff = 80.0
+        # Filter state for the one contiguous stream fed through ingest()
+        self._prev_x = 0.0
+        self._prev_y = 0.0
+        
         # Adaptive noise handling - will be calibrated
         self.noise_floor_rms = 0.01  # Initial estimate, will be calibrated
         self.noise_floor_intensity = 30  # Initial estimate, will be calibrated
         self.is_calibrated = False
-        self.calibration_samples = []
         self.calibration_duration = 1.0  # 1 second of calibration
         self.calibration_samples_needed = int(sample_rate * self.calibration_duration)
+        # Per-chunk RMS values from the last second, kept in a fixed ring
+        self.calibration_max_samples = int(sample_rate * self.calibration_duration / 512)  # Assuming ~512 sample chunks
+        self.calibration_samples = np.empty(self.calibration_max_samples, dtype=np.float32)
+        self._cal_idx = 0
+        self._cal_count = 0
         
         # Thresholds relative to noise floor (adaptive)
         self.rms_threshold_multiplier = 2.5  # Must be 2.5x above noise floor
@@ -84,43 +192,79 @@ class AudioAnalyzer:
         self._last_f3 = 0
         self._last_pitch = 0
         
-    def calibrate_noise_floor(self, audio_data: np.ndarray) -> bool:
+    @property
+    def hpf_cutoff(self) -> float:
+        """High-pass cutoff in Hz."""
+        return self._hpf_cutoff
+    
+    @hpf_cutoff.setter
+    def hpf_cutoff(self, cutoff: float):
+        # The coefficient depends on the cutoff and sample rate only, so it is
+        # computed here rather than per chunk
+        self._hpf_cutoff = cutoff
+        dt = 1.0 / self.sample_rate
+        rc = 1.0 / (2.0 * np.pi * cutoff)
+        self._hpf_alpha = rc / (rc + dt)
+    
+    def ingest(self, pcm: np.ndarray, out: Optional[np.ndarray] = None) -> tuple[np.ndarray, float]:
+        """
+        Convert a streamed Int16 PCM chunk to float, high-pass filter it and
+        measure its RMS in one pass. Filter state carries over between calls,
+        so chunks must be fed in order, all from one stream: each connection
+        needs its own analyzer.
+        Pass a reusable float32 scratch buffer as out to avoid allocating;
+        the returned audio is then a view into it.
+        """
+        n = len(pcm)
+        if out is None or len(out) < n:
+            out = np.empty(n, dtype=np.float32)
+        filtered = out[:n]
+        rms, self._prev_x, self._prev_y = _hpf_rms_kernel(
+            pcm, 1.0 / 32768.0, self._hpf_alpha, self._prev_x, self._prev_y, filtered
+        )
+        return filtered, rms
+    
+    def is_silent(self, rms: float) -> bool:
+        """Whether audio with this RMS is too quiet to analyze."""
+        return rms < self._rms_threshold()
+    
+    def calibrate_noise_floor(self, audio_data: np.ndarray, rms: Optional[float] = None) -> bool:
         """
         Calibrate noise floor from ambient audio (should be called when user is silent).
+        Pass rms if it is already known (e.g. from ingest()).
         Returns True when calibration is complete.
         """
         if len(audio_data) < 256:
             return False
         
-        if audio_data.dtype != np.float64:
-            audio_data = audio_data.astype(np.float64)
+        audio_data = np.ascontiguousarray(audio_data, dtype=np.float32)
         
         # Calculate RMS for this sample
-        rms = np.sqrt(np.mean(audio_data ** 2))
-        
-        # Store calibration samples
-        self.calibration_samples.append(rms)
+        if rms is None:
+            rms = _rms(audio_data)
         
-        # Keep only recent samples (last 1 second)
-        max_samples = int(self.sample_rate * self.calibration_duration / 512)  # Assuming ~512 sample chunks
-        if len(self.calibration_samples) > max_samples:
-            self.calibration_samples = self.calibration_samples[-max_samples:]
+        # Store calibration samples, keeping only recent ones (last 1 second)
+        max_samples = self.calibration_max_samples
+        self.calibration_samples[self._cal_idx] = rms
+        self._cal_idx = (self._cal_idx + 1) % max_samples
+        self._cal_count = min(self._cal_count + 1, max_samples)
         
         # Need at least 0.5 seconds of data to calibrate
-        if len(self.calibration_samples) >= max_samples // 2:
-            # Use 90th percentile to avoid outliers (like brief sounds)
-            sorted_samples = sorted(self.calibration_samples)
-            percentile_idx = int(len(sorted_samples) * 0.9)
-            self.noise_floor_rms = sorted_samples[percentile_idx]
+        if self._cal_count >= max_samples // 2:
+            # Use 90th percentile to avoid outliers (like brief sounds);
+            # partition selects it in O(n) without a full sort
+            percentile_idx = int(self._cal_count * 0.9)
+            samples = self.calibration_samples[:self._cal_count]
+            self.noise_floor_rms = float(np.partition(samples, percentile_idx)[percentile_idx])
             
             # Also estimate intensity from a sample
             try:
                 sound = parselmouth.Sound(audio_data, sampling_frequency=self.sample_rate)
                 intensity = self._get_intensity(sound)
-                # Use a conservative estimate (lower than measured)
-                self.noise_floor_intensity = max(20, intensity - 5)
-            except:
-                pass
+            except Exception:
+                intensity = 0
+            # Use a conservative estimate (lower than measured)
+            self.noise_floor_intensity = max(20, intensity - 5)
             
             self.is_calibrated = True
             logger.info(f"Noise floor calibrated: RMS={self.noise_floor_rms:.4f}, Intensity={self.noise_floor_intensity:.1f}dB")
@@ -128,89 +272,140 @@ class AudioAnalyzer:
         
         return False
     
-    def analyze(self, audio_data: np.ndarray) -> AnalysisResult:
-        """Analyze audio with smoothing for real-time display."""
+    def analyze(self, audio_data: np.ndarray, prefiltered: bool = False) -> AnalysisResult:
+        """
+        Analyze audio with smoothing for real-time display.
+        Set prefiltered if the audio already went through ingest().
+        """
         try:
-            if len(audio_data) < 256:  # Too short to analyze
-                return self._silent_result()
-            
-            if audio_data.dtype != np.float64:
-                audio_data = audio_data.astype(np.float64)
-            
-            # Apply simple high-pass filter to reduce low-frequency noise (below 80Hz)
-            # This helps in noisy environments by filtering out rumble, HVAC, etc.
-            audio_data = self._high_pass_filter(audio_data, cutoff=80.0)
-            
-            # Quick energy check first (fast)
-            rms = np.sqrt(np.mean(audio_data ** 2))
-            
-            # Adaptive threshold based on noise floor
-            if self.is_calibrated:
-                rms_threshold = max(
-                    self.min_rms_threshold,
-                    self.noise_floor_rms * self.rms_threshold_multiplier
-                )
-            else:
-                # Use conservative threshold before calibration
-                rms_threshold = 0.04
-            
-            if rms < rms_threshold:
-                return self._silent_result()
-            
-            sound = parselmouth.Sound(audio_data, sampling_frequency=self.sample_rate)
-            
-            intensity = self._get_intensity(sound)
-            
-            # Adaptive intensity threshold
-            if self.is_calibrated:
-                intensity_threshold = max(
-                    self.min_intensity_threshold,
-                    self.noise_floor_intensity + self.intensity_threshold_offset
+            window = self.prepare(audio_data, prefiltered)
+            measured = None
+            if window is not None:
+                measured = self.measure(
+                    window, self.intensity_threshold(), self.reusable_formants()
                 )
-            else:
-                intensity_threshold = 45
-            
-            # Also check RMS is significantly above noise floor
-            rms_above_noise = rms > rms_threshold
-            is_voiced = intensity > intensity_threshold and rms_above_noise
-            
-            if not is_voiced:
-                # Decay smoothly to zero
-                self._last_f1 *= 0.8
-                self._last_f2 *= 0.8
-                return AnalysisResult(
-                    f1=self._last_f1, f2=self._last_f2, f3=0, pitch=0,
-                    intensity=intensity, is_voiced=False
-                )
-            
-            # Extract formants
-            f1, f2, f3 = self._get_formants(sound)
-            pitch = self._get_pitch(sound)
-            
-            # Apply smoothing
-            if self._last_f1 > 0:
-                f1 = self._smooth(f1, self._last_f1)
-                f2 = self._smooth(f2, self._last_f2)
-                f3 = self._smooth(f3, self._last_f3)
-                pitch = self._smooth(pitch, self._last_pitch)
-            
-            self._last_f1 = f1
-            self._last_f2 = f2
-            self._last_f3 = f3
-            self._last_pitch = pitch
-            
-            vowel, confidence = self._detect_vowel(f1, f2)
-            
-            return AnalysisResult(
-                f1=f1, f2=f2, f3=f3, pitch=pitch,
-                intensity=intensity, is_voiced=True,
-                detected_vowel=vowel, confidence=confidence
-            )
-            
+            return self.update(measured)
         except Exception as e:
             logger.warning(f"Analysis error: {e}")
             return self._silent_result()
     
+    def prepare(self, audio_data: np.ndarray, prefiltered: bool = False) -> Optional[np.ndarray]:
+        """
+        Filter a window and run the quick energy check.
+        Returns the audio to measure, or None if it is too short or too quiet.
+        """
+        if len(audio_data) < 256:  # Too short to analyze
+            return None
+        
+        # One contiguous float32 buffer shared by the filter and all Praat calls
+        audio_data = np.ascontiguousarray(audio_data, dtype=np.float32)
+        
+        if prefiltered:
+            # Quick energy check first (fast)
+            rms = _rms(audio_data)
+        else:
+            # Apply simple high-pass filter to reduce low-frequency noise (below 80Hz)
+            # This helps in noisy environments by filtering out rumble, HVAC, etc.
+            # The energy check comes out of the same pass.
+            audio_data, rms = self._high_pass_filter(audio_data)
+        
+        if self.is_silent(rms):
+            return None
+        return audio_data
+    
+    def reusable_formants(self) -> Optional[tuple[float, float, float]]:
+        """
+        Formants to pass to measure() in place of a fresh formant analysis,
+        or None when this window is due for one. Call once per measured window
+        of this analyzer's stream; the cache must not be shared between streams.
+        """
+        self._formant_tick += 1
+        if self._raw_formants is None or self._formant_tick >= self.formant_interval:
+            self._formant_tick = 0
+            return None
+        return self._raw_formants
+    
+    def measure(
+        self, audio_data: np.ndarray, intensity_threshold: float,
+        formants: Optional[tuple[float, float, float]] = None
+    ) -> AnalysisResult:
+        """
+        Run the Praat measurements on a prepared window, without smoothing.
+        If formants are given they are reused instead of running formant analysis.
+        Only reads analysis settings, so it can run in a worker process.
+        """
+        sound = parselmouth.Sound(audio_data, sampling_frequency=self.sample_rate)
+        
+        intensity = self._get_intensity(sound)
+        
+        # prepare() already checked RMS is significantly above noise floor
+        if intensity <= intensity_threshold:
+            return AnalysisResult(f1=0, f2=0, f3=0, pitch=0, intensity=intensity, is_voiced=False)
+        
+        # Extract formants
+        f1, f2, f3 = formants if formants is not None else self._get_formants(audio_data)
+        pitch = self._get_pitch(sound)
+        
+        return AnalysisResult(f1=f1, f2=f2, f3=f3, pitch=pitch, intensity=intensity, is_voiced=True)
+    
+    def update(self, measured: Optional[AnalysisResult]) -> AnalysisResult:
+        """Apply smoothing and vowel detection to a raw measure() result."""
+        if measured is None:
+            self._raw_formants = None
+            return self._silent_result()
+        
+        if not measured.is_voiced:
+            self._raw_formants = None
+            # Decay smoothly to zero
+            self._last_f1 *= 0.8
+            self._last_f2 *= 0.8
+            return AnalysisResult(
+                f1=self._last_f1, f2=self._last_f2, f3=0, pitch=0,
+                intensity=measured.intensity, is_voiced=False
+            )
+        
+        f1, f2, f3, pitch = measured.f1, measured.f2, measured.f3, measured.pitch
+        self._raw_formants = (f1, f2, f3)
+        
+        # Apply smoothing
+        if self._last_f1 > 0:
+            f1 = self._smooth(f1, self._last_f1)
+            f2 = self._smooth(f2, self._last_f2)
+            f3 = self._smooth(f3, self._last_f3)
+            pitch = self._smooth(pitch, self._last_pitch)
+        
+        self._last_f1 = f1
+        self._last_f2 = f2
+        self._last_f3 = f3
+        self._last_pitch = pitch
+        
+        vowel, confidence = self._detect_vowel(f1, f2)
+        
+        return AnalysisResult(
+            f1=f1, f2=f2, f3=f3, pitch=pitch,
+            intensity=measured.intensity, is_voiced=True,
+            detected_vowel=vowel, confidence=confidence
+        )
+    
+    def intensity_threshold(self) -> float:
+        """Adaptive intensity threshold based on noise floor."""
+        if self.is_calibrated:
+            return max(
+                self.min_intensity_threshold,
+                self.noise_floor_intensity + self.intensity_threshold_offset
+            )
+        return 45
+    
+    def _rms_threshold(self) -> float:
+        """Adaptive RMS threshold based on noise floor."""
+        if self.is_calibrated:
+            return max(
+                self.min_rms_threshold,
+                self.noise_floor_rms * self.rms_threshold_multiplier
+            )
+        # Use conservative threshold before calibration
+        return 0.04
+    
     def _smooth(self, new_val: float, old_val: float) -> float:
         """Exponential smoothing."""
         if new_val == 0:
@@ -220,84 +415,83 @@ class AudioAnalyzer:
     def _silent_result(self) -> AnalysisResult:
         return AnalysisResult(f1=0, f2=0, f3=0, pitch=0, intensity=0, is_voiced=False)
     
-    def _get_formants(self, sound: parselmouth.Sound) -> tuple[float, float, float]:
-        """Extract formants using Burg algorithm."""
-        try:
-            formant = call(
-                sound, "To Formant (burg)",
-                0.0, self.max_formants, self.max_formant_freq,
-                self.window_length, self.pre_emphasis
-            )
-            
-            mid_time = sound.duration / 2
-            
-            f1 = call(formant, "Get value at time", 1, mid_time, "Hertz", "Linear")
-            f2 = call(formant, "Get value at time", 2, mid_time, "Hertz", "Linear")
-            f3 = call(formant, "Get value at time", 3, mid_time, "Hertz", "Linear")
-            
-            return (
-                f1 if not np.isnan(f1) else 0,
-                f2 if not np.isnan(f2) else 0,
-                f3 if not np.isnan(f3) else 0
-            )
-        except:
-            return 0, 0, 0
+    # The extractors below don't catch errors themselves; the caller's
+    # try/except handles failures. Pitch and intensity share one Sound.
+    
+    def _get_formants(self, audio_data: np.ndarray) -> tuple[float, float, float]:
+        """Extract formants from a Burg LPC fit of the centre of the window."""
+        audio_data = self._resample_for_formants(audio_data)
+        window = self._formant_window
+        if len(audio_data) < len(window):
+            window = np.hamming(len(audio_data))
+        start = (len(audio_data) - len(window)) // 2
+        frame = audio_data[start:start + len(window)]
+        
+        # Pre-emphasis from 50Hz, as in Praat
+        emphasized = np.empty(len(frame))
+        emphasized[0] = frame[0]
+        emphasized[1:] = frame[1:] - self._pre_emphasis_coef * frame[:-1]
+        
+        coeffs = _burg_lpc(emphasized * window, self.lpc_order)
+        
+        # Formants are the resonances of the LPC poles in the upper half
+        # plane. Praat's rule: keep every pole between 50Hz and 50Hz below
+        # the ceiling, however wide, so a noisy F1 stays in the F1 slot.
+        roots = np.roots(coeffs)
+        roots = roots[roots.imag > 0]
+        freqs = np.sort(np.angle(roots) * (self._formant_rate / (2 * np.pi)))
+        freqs = freqs[(freqs > 50) & (freqs < self.max_formant_freq - 50)]
+        
+        # Formants that weren't found are reported as 0
+        found = [float(f) for f in freqs[:3]]
+        found += [0.0] * (3 - len(found))
+        return found[0], found[1], found[2]
+    
+    def _resample_for_formants(self, audio_data: np.ndarray) -> np.ndarray:
+        """Band-limit and resample to the formant analysis rate via the FFT."""
+        n = len(audio_data)
+        m = int(round(n * self._formant_rate / self.sample_rate))
+        if m == n:
+            return audio_data.astype(np.float64)
+        spectrum = np.fft.rfft(audio_data.astype(np.float64))
+        # irfft drops the bins above the new Nyquist, or zero-pads to it
+        return np.fft.irfft(spectrum[:m // 2 + 1], m) * (m / n)
     
     def _get_pitch(self, sound: parselmouth.Sound) -> float:
         """Extract pitch."""
-        try:
-            pitch = call(sound, "To Pitch", 0.0, self.pitch_floor, self.pitch_ceiling)
-            f0 = call(pitch, "Get value at time", sound.duration / 2, "Hertz", "Linear")
-            return f0 if not np.isnan(f0) else 0
-        except:
-            return 0
+        pitch = call(sound, "To Pitch", 0.0, self.pitch_floor, self.pitch_ceiling)
+        f0 = call(pitch, "Get value at time", sound.duration / 2, "Hertz", "Linear")
+        return float(np.nan_to_num(f0, nan=0.0))
     
     def _get_intensity(self, sound: parselmouth.Sound) -> float:
         """Get intensity in dB."""
-        try:
-            intensity = call(sound, "To Intensity", 100, 0.0)
-            return call(intensity, "Get mean", 0, 0, "dB") or 0
-        except:
-            return 0
+        intensity = call(sound, "To Intensity", 100, 0.0)
+        return call(intensity, "Get mean", 0, 0, "dB") or 0
     
-    def _high_pass_filter(self, audio_data: np.ndarray, cutoff: float = 80.0) -> np.ndarray:
+    def _high_pass_filter(self, audio_data: np.ndarray) -> tuple[np.ndarray, float]:
         """
         Simple high-pass filter using a first-order IIR filter.
         Removes low-frequency noise (rumble, HVAC, etc.) that can interfere with speech analysis.
+        Returns the filtered audio and its RMS.
         """
-        if len(audio_data) < 2:
-            return audio_data
-        
-        # Calculate filter coefficient for first-order high-pass
-        # Using a simple RC high-pass filter approximation
-        dt = 1.0 / self.sample_rate
-        rc = 1.0 / (2.0 * np.pi * cutoff)
-        alpha = rc / (rc + dt)
-        
-        # Apply filter (simple one-pole high-pass)
-        filtered = np.zeros_like(audio_data)
-        filtered[0] = audio_data[0]
-        for i in range(1, len(audio_data)):
-            filtered[i] = alpha * (filtered[i-1] + audio_data[i] - audio_data[i-1])
-        
-        return filtered
+        # Start the filter in steady state for the first sample so each window
+        # doesn't begin with a step transient (click). State is not carried
+        # between calls: analysis windows overlap, so they aren't contiguous.
+        filtered = np.empty(len(audio_data), dtype=np.float32)
+        rms, _, _ = _hpf_rms_kernel(audio_data, 1.0, self._hpf_alpha, audio_data[0], 0.0, filtered)
+        return filtered, rms
     
     def _detect_vowel(self, f1: float, f2: float) -> tuple[Optional[str], float]:
         """Detect nearest IPA vowel."""
         if f1 == 0 or f2 == 0:
             return None, 0
         
-        min_distance = float('inf')
-        nearest = None
-        
-        for vowel, values in IPA_VOWELS.items():
-            f1_diff = (f1 - values['f1']) * 1.2
-            f2_diff = (f2 - values['f2']) * 0.8
-            distance = np.sqrt(f1_diff**2 + f2_diff**2)
-            
-            if distance < min_distance:
-                min_distance = distance
-                nearest = vowel
+        # Squared distance ranks the same, so only the winner needs a sqrt
+        idx, d2 = _nearest_vowel(
+            f1 * _F1_WEIGHT, f2 * _F2_WEIGHT, _IPA_F1_SCALED, _IPA_F2_SCALED
+        )
+        nearest = _IPA_KEYS[idx]
+        min_distance = math.sqrt(d2)
         
         confidence = max(0, 1 - (min_distance / 400))
         return nearest, confidence
@@ -308,8 +502,13 @@ class AudioAnalyzer:
         self._last_f2 = 0
         self._last_f3 = 0
         self._last_pitch = 0
+        self._raw_formants = None
+        self._formant_tick = 0
+        self._prev_x = 0.0
+        self._prev_y = 0.0
         self.is_calibrated = False
-        self.calibration_samples = []
+        self._cal_idx = 0
+        self._cal_count = 0
         self.noise_floor_rms = 0.01
         self.noise_floor_intensity = 30
 
@@ -317,7 +516,35 @@ class AudioAnalyzer:
 _analyzer = None
 
 def get_analyzer(sample_rate: int = 16000) -> AudioAnalyzer:
+    """
+    Per-process analyzer for executor workers, which only call measure().
+    Streams need their own AudioAnalyzer for the stateful methods.
+    """
     global _analyzer
     if _analyzer is None or _analyzer.sample_rate != sample_rate:
         _analyzer = AudioAnalyzer(sample_rate)
     return _analyzer
+
+
+def measure_window(
+    audio_data: np.ndarray, sample_rate: int, intensity_threshold: float,
+    formants: Optional[tuple[float, float, float]] = None
+) -> Optional[AnalysisResult]:
+    """
+    AudioAnalyzer.measure() for executor workers, using the per-process analyzer.
+    Returns None if Praat fails.
+    """
+    try:
+        return get_analyzer(sample_rate).measure(audio_data, intensity_threshold, formants)
+    except Exception as e:
+        logger.warning(f"Analysis error: {e}")
+        return None
+
+
+def measure_batch(sample_rate: int, requests: list) -> list[Optional[AnalysisResult]]:
+    """
+    measure_window() over a batch of (audio_data, intensity_threshold, formants)
+    requests, so one executor job serves several windows.
+    """
+    return [measure_window(audio_data, sample_rate, threshold, formants)
+            for audio_data, threshold, formants in requests]
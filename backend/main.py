@@ -3,17 +3,128 @@ FastAPI backend for real-time audio analysis.
 Optimized for low-latency streaming.
 """
 import asyncio
-import json
 import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional
 import numpy as np
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from audio_analyzer import get_analyzer, AnalysisResult
+from audio_analyzer import AudioAnalyzer, get_analyzer, measure_batch, AnalysisResult
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="CLB Audio Analysis API")
+# Optimized for low latency
+SAMPLE_RATE = 16000
+MIN_CHUNK_SIZE = 1024  # ~64ms - minimum for analysis
+PROCESS_EVERY = 512    # Process every 32ms of new audio
+MAX_BUFFER = int(SAMPLE_RATE * 0.2)  # Keep the last ~200ms
+ANALYSIS_WORKERS = os.cpu_count() or 1
+MAX_BATCH = 8  # Most windows per executor job, ~1ms each, well inside PROCESS_EVERY
+
+# Vowel-space position: F2 800-2400Hz maps to x 1-0, F1 250-850Hz to y 0-1
+F2_SCALE = 1.0 / 1600
+F1_SCALE = 1.0 / 600
+
+
+class MeasurementBatcher:
+    """
+    Coalesces measurement requests from all connections into batched executor
+    jobs. At most one job per worker is in flight; requests that queue up while
+    the workers are busy are split over the workers that free up next.
+    """
+    
+    def __init__(self, executor: ProcessPoolExecutor, max_in_flight: int, max_batch: int):
+        self._executor = executor
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._max_batch = max_batch
+    
+    async def measure(self, audio_data: np.ndarray, intensity_threshold: float,
+                      formants: Optional[tuple[float, float, float]]) -> Optional[AnalysisResult]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(((audio_data, intensity_threshold, formants), future))
+        return await future
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            await self._slots.acquire()
+            jobs = 1
+            # Spread what else is waiting over every free worker, with at most
+            # max_batch windows per job
+            while not self._queue.empty():
+                if len(requests) >= jobs * self._max_batch:
+                    if self._slots.locked():
+                        break
+                    await self._slots.acquire()
+                    jobs += 1
+                requests.append(self._queue.get_nowait())
+            while jobs < len(requests) and not self._slots.locked():
+                await self._slots.acquire()
+                jobs += 1
+            
+            # Exactly one non-empty batch per acquired slot, so every slot is
+            # released again when its batch is delivered
+            n = len(requests)
+            for j in range(jobs):
+                self._submit(loop, requests[j * n // jobs:(j + 1) * n // jobs])
+    
+    def _submit(self, loop: asyncio.AbstractEventLoop, batch: list):
+        try:
+            job = loop.run_in_executor(
+                self._executor, measure_batch, SAMPLE_RATE, [request for request, _ in batch]
+            )
+        except Exception as e:
+            # Broken or shut-down pool: fail these callers, keep serving the rest
+            logger.error(f"Measurement submit failed: {e}")
+            self._slots.release()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        job.add_done_callback(partial(self._deliver, batch))
+    
+    def _deliver(self, batch: list, job: asyncio.Future):
+        self._slots.release()
+        for i, (_, future) in enumerate(batch):
+            if future.done():  # Caller went away
+                continue
+            if job.cancelled():
+                future.cancel()
+            elif job.exception() is not None:
+                future.set_exception(job.exception())
+            else:
+                future.set_result(job.result()[i])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Praat analysis is CPU-bound, so it runs in worker processes instead of
+    # blocking the event loop. Each worker builds its own analyzer at start.
+    # Spawn them instead of forking the multi-threaded server process; spawn
+    # is also available on every platform.
+    executor = ProcessPoolExecutor(
+        max_workers=ANALYSIS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=get_analyzer,
+        initargs=(SAMPLE_RATE,),
+    )
+    app.state.batcher = MeasurementBatcher(executor, ANALYSIS_WORKERS, MAX_BATCH)
+    batcher_task = asyncio.create_task(app.state.batcher.run())
+    yield
+    batcher_task.cancel()
+    executor.shutdown()
+
+
+app = FastAPI(title="CLB Audio Analysis API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,10 +134,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Optimized for low latency
-SAMPLE_RATE = 16000
-MIN_CHUNK_SIZE = 1024  # ~64ms - minimum for analysis
-PROCESS_EVERY = 512    # Process every 32ms of new audio
+
+class AudioRingBuffer:
+    """Preallocated ring buffer holding the most recent audio samples."""
+    
+    def __init__(self, capacity: int, dtype=np.float32):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._write_idx = 0
+        self._filled = 0
+    
+    def __len__(self) -> int:
+        return self._filled
+    
+    def write(self, samples: np.ndarray):
+        """Append samples, overwriting the oldest ones once full."""
+        capacity = len(self._data)
+        n = len(samples)
+        if n >= capacity:
+            self._data[:] = samples[-capacity:]
+            self._write_idx = 0
+            self._filled = capacity
+            return
+        
+        end = self._write_idx + n
+        if end <= capacity:
+            self._data[self._write_idx:end] = samples
+        else:
+            split = capacity - self._write_idx
+            self._data[self._write_idx:] = samples[:split]
+            self._data[:n - split] = samples[split:]
+        self._write_idx = end % capacity
+        self._filled = min(capacity, self._filled + n)
+    
+    def latest(self, n: int) -> np.ndarray:
+        """Most recent n samples; a view unless they wrap around the end."""
+        start = self._write_idx - n
+        if start >= 0:
+            return self._data[start:self._write_idx]
+        return np.concatenate((self._data[start:], self._data[:self._write_idx]))
+    
+    def clear(self):
+        self._write_idx = 0
+        self._filled = 0
 
 
 def result_to_dict(result: AnalysisResult) -> dict:
@@ -41,12 +190,23 @@ def result_to_dict(result: AnalysisResult) -> dict:
         "detectedVowel": result.detected_vowel,
         "confidence": round(result.confidence, 3),
         "position": {
-            "x": min(1, max(0, 1 - (result.f2 - 800) / 1600)) if result.f2 > 0 else 0.5,
-            "y": min(1, max(0, (result.f1 - 250) / 600)) if result.f1 > 0 else 0.5,
+            "x": max(0.0, min(1.0, 1.0 - (result.f2 - 800) * F2_SCALE)) if result.f2 > 0 else 0.5,
+            "y": max(0.0, min(1.0, (result.f1 - 250) * F1_SCALE)) if result.f1 > 0 else 0.5,
         }
     }
 
 
+async def send_payload(websocket: WebSocket, payload: dict):
+    """Send a JSON text frame, encoded with orjson (NumPy scalars included)."""
+    await websocket.send_text(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY).decode())
+
+
+# Sent in place of an analysis when every chunk in the window was too quiet
+SILENT_PAYLOAD = result_to_dict(
+    AnalysisResult(f1=0, f2=0, f3=0, pitch=0, intensity=0, is_voiced=False)
+)
+
+
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "CLB Audio Analysis API - Low Latency Mode"}
@@ -62,12 +222,16 @@ async def websocket_audio(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connected (low-latency mode)")
     
-    analyzer = get_analyzer(SAMPLE_RATE)
-    analyzer.reset()
+    # Filter, calibration, smoothing and formant-reuse state belong to this
+    # stream, so every connection gets its own analyzer
+    analyzer = AudioAnalyzer(SAMPLE_RATE)
+    batcher = websocket.app.state.batcher
     
     # Rolling buffer for continuous analysis
-    audio_buffer = np.array([], dtype=np.float64)
+    audio_buffer = AudioRingBuffer(MAX_BUFFER)
+    scratch = np.empty(PROCESS_EVERY, dtype=np.float32)  # Per-chunk conversion buffer
     samples_since_last_process = 0
+    silent_samples = 0  # Trailing run of samples too quiet to analyze
     
     # Calibration state
     calibrating = True
@@ -78,34 +242,39 @@ async def websocket_audio(websocket: WebSocket):
             data = await websocket.receive()
             
             if "bytes" in data:
-                # Convert Int16 PCM to float64
                 audio_chunk = np.frombuffer(data["bytes"], dtype=np.int16)
-                audio_float = audio_chunk.astype(np.float64) / 32768.0
                 
-                # Add to rolling buffer
-                audio_buffer = np.concatenate([audio_buffer, audio_float])
+                # Int16 PCM -> float32, high-pass filtered, with RMS (single
+                # compiled pass), written into the reusable scratch buffer
+                if len(audio_chunk) > len(scratch):
+                    scratch = np.empty(len(audio_chunk), dtype=np.float32)
+                audio_float, chunk_rms = analyzer.ingest(audio_chunk, out=scratch)
+                
+                # Add to rolling buffer (oldest samples are overwritten)
+                audio_buffer.write(audio_float)
                 samples_since_last_process += len(audio_float)
                 
-                # Keep buffer size reasonable (last ~200ms)
-                max_buffer = int(SAMPLE_RATE * 0.2)
-                if len(audio_buffer) > max_buffer:
-                    audio_buffer = audio_buffer[-max_buffer:]
+                # A window made only of quiet chunks is quiet as a whole
+                if not calibrating and analyzer.is_silent(chunk_rms):
+                    silent_samples += len(audio_float)
+                else:
+                    silent_samples = 0
                 
                 # Calibration phase: measure ambient noise for first ~1 second
                 if calibrating:
                     if not calibration_started:
                         calibration_started = True
-                        await websocket.send_json({
+                        await send_payload(websocket, {
                             "type": "calibrating",
                             "message": "Calibrating to ambient noise... Please stay quiet."
                         })
                     
                     # Use audio for calibration
                     if len(audio_float) >= 256:
-                        is_calibrated = analyzer.calibrate_noise_floor(audio_float)
+                        is_calibrated = analyzer.calibrate_noise_floor(audio_float, chunk_rms)
                         if is_calibrated:
                             calibrating = False
-                            await websocket.send_json({
+                            await send_payload(websocket, {
                                 "type": "calibrated",
                                 "noiseFloor": {
                                     "rms": round(analyzer.noise_floor_rms, 4),
@@ -119,28 +288,43 @@ async def websocket_audio(websocket: WebSocket):
                 if not calibrating and samples_since_last_process >= PROCESS_EVERY and len(audio_buffer) >= MIN_CHUNK_SIZE:
                     samples_since_last_process = 0
                     
-                    # Analyze the recent audio
-                    chunk_to_analyze = audio_buffer[-MIN_CHUNK_SIZE:]
-                    result = analyzer.analyze(chunk_to_analyze)
-                    
-                    await websocket.send_json(result_to_dict(result))
+                    if silent_samples >= MIN_CHUNK_SIZE:
+                        # Whole window is too quiet, nothing to analyze
+                        analyzer.update(None)
+                        await send_payload(websocket, SILENT_PAYLOAD)
+                    else:
+                        # Analyze the recent audio: cheap gating here, Praat in a
+                        # worker (batched with other connections)
+                        chunk_to_analyze = analyzer.prepare(
+                            audio_buffer.latest(MIN_CHUNK_SIZE), prefiltered=True
+                        )
+                        measured = None
+                        if chunk_to_analyze is not None:
+                            measured = await batcher.measure(
+                                chunk_to_analyze.copy(), analyzer.intensity_threshold(),
+                                analyzer.reusable_formants()
+                            )
+                        result = analyzer.update(measured)
+                        
+                        await send_payload(websocket, result_to_dict(result))
                     
             elif "text" in data:
-                msg = json.loads(data["text"])
+                msg = orjson.loads(data["text"])
                 if msg.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await send_payload(websocket, {"type": "pong"})
                 elif msg.get("type") == "reset":
-                    audio_buffer = np.array([], dtype=np.float64)
+                    audio_buffer.clear()
+                    silent_samples = 0
                     analyzer.reset()
                     calibrating = True
                     calibration_started = False
-                    await websocket.send_json({"type": "reset_ack"})
+                    await send_payload(websocket, {"type": "reset_ack"})
                 elif msg.get("type") == "recalibrate":
                     # Manual recalibration request
                     analyzer.reset()
                     calibrating = True
                     calibration_started = False
-                    await websocket.send_json({
+                    await send_payload(websocket, {
                         "type": "calibrating",
                         "message": "Recalibrating to ambient noise... Please stay quiet."
                     })
@@ -153,4 +337,6 @@ async def websocket_audio(websocket: WebSocket):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # uvloop comes with uvicorn[standard] everywhere except Windows
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop=loop, ws="websockets")
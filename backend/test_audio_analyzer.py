@@ -0,0 +1,62 @@
+"""
+Formant extraction checked against Praat's "To Formant (burg)" on noisy
+synthetic vowels. Run with: python -m pytest test_audio_analyzer.py
+"""
+
+import numpy as np
+import parselmouth
+from parselmouth.praat import call
+
+from audio_analyzer import AudioAnalyzer
+
+SAMPLE_RATE = 16000
+WINDOW = 1024
+
+# (frequency, bandwidth) of the first four formants
+VOWELS = {
+    'a': [(700, 130), (1200, 90), (2600, 120), (3500, 200)],
+    'i': [(280, 60), (2300, 100), (3000, 150), (3800, 200)],
+    'u': [(300, 60), (900, 80), (2400, 120), (3400, 200)],
+    'e': [(500, 70), (1500, 90), (2500, 120), (3500, 200)],
+}
+
+
+def _synth_vowel(formants, noise: float, seed: int, f0: float = 120) -> np.ndarray:
+    """Glottal pulse train through two-pole resonators, plus white noise."""
+    y = np.zeros(WINDOW * 3)
+    y[::int(SAMPLE_RATE / f0)] = 1.0
+    for freq, bw in formants:
+        r = np.exp(-np.pi * bw / SAMPLE_RATE)
+        c1 = 2 * r * np.cos(2 * np.pi * freq / SAMPLE_RATE)
+        c2 = -r * r
+        out = np.zeros(len(y) + 2)
+        for i in range(len(y)):
+            out[i + 2] = y[i] + c1 * out[i + 1] + c2 * out[i]
+        y = out[2:]
+    y = y[WINDOW:2 * WINDOW]
+    y = y / np.sqrt(np.mean(y ** 2)) * 0.1
+    rng = np.random.default_rng(seed)
+    return (y + rng.standard_normal(WINDOW) * 0.1 * noise).astype(np.float32)
+
+
+def _praat_formants(audio: np.ndarray) -> list[float]:
+    sound = parselmouth.Sound(audio.astype(np.float64), sampling_frequency=SAMPLE_RATE)
+    formant = call(sound, "To Formant (burg)", 0.0, 5, 5500, 0.015, 50)
+    mid = sound.duration / 2
+    values = [call(formant, "Get value at time", i, mid, "Hertz", "Linear") for i in (1, 2)]
+    return [float(np.nan_to_num(v, nan=0.0)) for v in values]
+
+
+def test_formants_follow_praat_on_noisy_vowels():
+    analyzer = AudioAnalyzer(SAMPLE_RATE)
+    for name, formants in VOWELS.items():
+        agree = 0
+        trials = 10
+        for seed in range(trials):
+            audio = _synth_vowel(formants, noise=0.5, seed=seed)
+            f1, f2, _ = analyzer._get_formants(audio)
+            p1, p2 = _praat_formants(audio)
+            if abs(f1 - p1) <= 0.15 * max(p1, 1) and abs(f2 - p2) <= 0.15 * max(p2, 1):
+                agree += 1
+        assert agree >= 0.6 * trials, f"/{name}/: F1/F2 matched Praat in {agree}/{trials} windows"
+
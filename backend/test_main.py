@@ -0,0 +1,67 @@
+"""
+Slot accounting of MeasurementBatcher, with measure_batch stubbed out and a
+thread pool in place of the worker processes.
+Run with: python -m pytest test_main.py
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import main
+
+
+def _stub_measure_batch(sample_rate, requests):
+    time.sleep(0.002)
+    return [threshold for _, threshold, _ in requests]
+
+
+def _run_bursts(max_in_flight: int, max_batch: int, sizes: list[int]):
+    async def go():
+        executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        batcher = main.MeasurementBatcher(executor, max_in_flight, max_batch)
+        task = asyncio.create_task(batcher.run())
+        try:
+            audio = np.zeros(main.MIN_CHUNK_SIZE, dtype=np.float32)
+            for size in sizes:
+                results = await asyncio.gather(
+                    *[batcher.measure(audio, float(i), None) for i in range(size)]
+                )
+                assert results == [float(i) for i in range(size)]
+            # Let the done callbacks of the last jobs run
+            await asyncio.sleep(0.05)
+            return batcher._slots._value
+        finally:
+            task.cancel()
+            executor.shutdown()
+    
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("max_in_flight,max_batch", [(1, 8), (4, 8), (8, 8), (4, 2)])
+def test_slots_are_all_released_after_bursts(monkeypatch, max_in_flight, max_batch):
+    monkeypatch.setattr(main, "measure_batch", _stub_measure_batch)
+    sizes = [1, 2, 3, 5, 9, 17, 33, 4, 7]
+    assert _run_bursts(max_in_flight, max_batch, sizes * 3) == max_in_flight
+
+
+def test_failed_submit_releases_slot_and_fails_callers():
+    async def go():
+        executor = ThreadPoolExecutor(max_workers=2)
+        batcher = main.MeasurementBatcher(executor, 2, 8)
+        task = asyncio.create_task(batcher.run())
+        executor.shutdown()
+        try:
+            audio = np.zeros(main.MIN_CHUNK_SIZE, dtype=np.float32)
+            for _ in range(3):
+                with pytest.raises(RuntimeError):
+                    await asyncio.wait_for(batcher.measure(audio, 40.0, None), 1)
+            assert not task.done()
+            return batcher._slots._value
+        finally:
+            task.cancel()
+    
+    assert asyncio.run(go()) == 2